@@ -4,12 +4,17 @@ This module provides utilities for CoT reasoning approaches.
 """
 import sys
 import os
+import json
 
 # Add the parent directory to the Python path to import from src
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from src.utils import *
 from src.model import *
+from src.tracing import span, traced, record_usage
+from src.ingestion import load_queries
+from src.result_store import ResultStore, prompt_hash
+from src.structured_output import FINAL_ANSWER_SCHEMA, schema_instruction, invoke_structured_batch
 
 
 def cot_prompt(task_description, context="", include_reasoning=True):
@@ -46,31 +51,53 @@ def cot_prompt(task_description, context="", include_reasoning=True):
     return prompt.strip()
 
 
-def evaluate_cot_response(response, expected_output=None):
+def evaluate_cot_response(response, expected_output=None, structured=False, grader=None):
     """
     Evaluate the quality of a Chain-of-Thought response.
     
     Args:
         response (str): The agent's CoT response
         expected_output (str): Expected output for comparison
+        structured (bool): Grade the structured final answer, recording verdict and score
+        grader: Model instance to grade with, defaults to the Gemini grader
     
     Returns:
         dict: Evaluation metrics
     """
     
+    if structured:
+        metrics = {"length": len(response)}
+        metrics.update(structured_answer_metrics(response, expected_output, grader))
+        metrics["has_final_answer"] = metrics["final_answer"] is not None
+        return metrics
+    
     metrics = {
         "length": len(response),
         "has_final_answer": bool(response.strip()),
-        "matches_expected": check_final_answer(response, expected_output) if expected_output else None,
+        "matches_expected": check_final_answer(response, expected_output, grader) if expected_output else None,
     }
     return metrics
 
 
-def use_cot_prompt():
+@traced("use_cot_prompt")
+def use_cot_prompt(structured=False, near_duplicate_threshold=None):
+    """
+    Run the CoT prompt over the input queries and evaluate the responses.
+    
+    Args:
+        structured (bool): Use JSON-schema-constrained output for safety, answers and grading
+        near_duplicate_threshold (float): Drop near-duplicate queries at this Jaccard similarity,
+            defaults to the AGENT_NEAR_DUP_THRESHOLD environment variable
+    
+    Returns:
+        list: Evaluation results
+    """
     file_path = "evaluation/input_queries.json"
-    queries = load_json(file_path)
+    queries, _ = load_queries(file_path, near_duplicate_threshold)
     model = get_model()
+    safety_model = get_safety_model()
     responses = []
+    safe_queries = []
     
     for query in queries:
         task_description = query.get("input", "")
@@ -78,16 +105,24 @@ def use_cot_prompt():
         expected_output = query.get("expected_output", None)
         
         # Generate CoT prompt
-        prompt = cot_prompt(task_description, context)
-        if is_query_harmful(prompt, model):
+        with span("prompt_construction", query_id=query.get("id", "")):
+            prompt = cot_prompt(task_description, context)
+        if is_query_harmful(prompt, safety_model, structured=structured):
             print(f"Query is harmful, skipping: {task_description}")
             continue
         else:
             print(f"Query is safe, processing: {task_description} ")
+            if structured:
+                # Generated together below so only malformed answers are re-requested
+                safe_queries.append((query, prompt))
+                continue
             
             try:
-                response = model.invoke(prompt)
+                with span("generation", query_id=query.get("id", "")) as generation_span:
+                    response = model.invoke(prompt)
+                    record_usage(generation_span, response, getattr(model, "model", None))
                 responses.append({
+                    "query_id": query.get("id", ""),
                     "task_description": task_description,
                     "response": response.content,  # Extract content from AIMessage
                     "expected_output": expected_output
@@ -97,13 +132,30 @@ def use_cot_prompt():
                 continue
 
 
+    if structured and safe_queries:
+        try:
+            with span("generation", items=len(safe_queries)):
+                answers = invoke_structured_batch(model, [prompt for _, prompt in safe_queries], FINAL_ANSWER_SCHEMA)
+        except Exception as e:
+            print(f"Error generating structured responses, Error: {e}")
+            answers = []
+        for (query, _), answer in zip(safe_queries, answers):
+            responses.append({
+                "query_id": query.get("id", ""),
+                "task_description": query.get("input", ""),
+                "response": json.dumps(answer, ensure_ascii=False) if answer is not None else "",
+                "expected_output": query.get("expected_output", None)
+            })
+
     evaluation_results = []
     for item in responses:
         response = item["response"]
         expected_output = item["expected_output"]
         task_description = item["task_description"]
-        metrics = evaluate_cot_response(response, expected_output)
+        with span("evaluation"):
+            metrics = evaluate_cot_response(response, expected_output, structured=structured)
         evaluation_results.append({
+            "query_id": item["query_id"],
             'task_description': task_description,
             "response": response,  
             "expected_output": expected_output,
@@ -111,6 +163,16 @@ def use_cot_prompt():
         })    # Save evaluation results
     output_file = "evaluation/cot_evaluation_results.json"
     save_json(evaluation_results, output_file)
+
+    # Record the run in the indexed result store for cross-run comparison
+    template = cot_prompt("{task_description}", "{context}")
+    if structured:
+        template += f"\n\n{schema_instruction(FINAL_ANSWER_SCHEMA)}"
+    template_hash = prompt_hash(template)
+    with ResultStore() as store:
+        run_id = store.start_run(strategy="cot", prompt_version=template_hash)
+        store.ingest(run_id, evaluation_results, agent_type="cot", prompt_version=template_hash)
+    print(f"Run {run_id} recorded in {store.db_path}")
     
     print(f"Evaluation completed. Results saved to {output_file}")
     return evaluation_results
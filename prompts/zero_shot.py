@@ -5,12 +5,17 @@ This module provides utilities for zero-shot learning approaches.
 
 import sys
 import os
+import json
 
 # Add the parent directory to the Python path to import from src
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from src.utils import *
 from src.model import *
+from src.tracing import span, traced, record_usage
+from src.ingestion import load_queries
+from src.result_store import ResultStore, prompt_hash
+from src.structured_output import FINAL_ANSWER_SCHEMA, schema_instruction, invoke_structured_batch
 
 def zero_shot_prompt(task_description, context=""):
     """
@@ -33,35 +38,46 @@ def zero_shot_prompt(task_description, context=""):
     """
     return prompt.strip()
 
-def evaluate_zero_shot_response(response, expected_output):
+def evaluate_zero_shot_response(response, expected_output, structured=False, grader=None):
     """
     Evaluate the quality of a zero-shot response.
     
     Args:
         response (str): The agent's response
         expected_output (str): Expected output for comparison
+        structured (bool): Grade the structured final answer, recording verdict and score
+        grader: Model instance to grade with, defaults to the Gemini grader
     
     Returns:
         dict: Evaluation metrics
     """
-    metrics = {
-        "length": len(response),
-        "matches_expected": check_final_answer(response, expected_output) if expected_output else None,
-    }
+    metrics = {"length": len(response)}
+    if structured:
+        metrics.update(structured_answer_metrics(response, expected_output, grader))
+    else:
+        metrics["matches_expected"] = check_final_answer(response, expected_output, grader) if expected_output else None
     return metrics
 
 
-def evaluate_zero_shot():
+@traced("evaluate_zero_shot")
+def evaluate_zero_shot(structured=False, near_duplicate_threshold=None):
     """
     Evaluate the quality of a zero-shot prompt and response.
     
+    Args:
+        structured (bool): Use JSON-schema-constrained output for safety, answers and grading
+        near_duplicate_threshold (float): Drop near-duplicate queries at this Jaccard similarity,
+            defaults to the AGENT_NEAR_DUP_THRESHOLD environment variable
+    
     Returns:
         dict: Evaluation metrics
     """
     file_path = "evaluation/input_queries.json"
-    queries = load_json(file_path)
+    queries, _ = load_queries(file_path, near_duplicate_threshold)
     model = get_model()
+    safety_model = get_safety_model()
     responses = []
+    safe_queries = []
     
     for query in queries:
         task_description = query.get("input", "")
@@ -69,17 +85,25 @@ def evaluate_zero_shot():
         expected_output = query.get("expected_output", None)
         
         # Generate zero-shot prompt
-        prompt = zero_shot_prompt(task_description, context)
+        with span("prompt_construction", query_id=query.get("id", "")):
+            prompt = zero_shot_prompt(task_description, context)
 
-        if is_query_harmful(prompt, model):
+        if is_query_harmful(prompt, safety_model, structured=structured):
             print(f"Query is harmful, skipping: {task_description}")
             continue
         else:
             print(f"Query is safe, processing: {task_description} ")
+            if structured:
+                # Generated together below so only malformed answers are re-requested
+                safe_queries.append((query, prompt))
+                continue
             
             try:
-                response = model.invoke(prompt)
+                with span("generation", query_id=query.get("id", "")) as generation_span:
+                    response = model.invoke(prompt)
+                    record_usage(generation_span, response, getattr(model, "model", None))
                 responses.append({
+                    "query_id": query.get("id", ""),
                     "task_description": task_description,
                     "response": response.content,  # Extract content from AIMessage
                     "expected_output": expected_output
@@ -88,14 +112,31 @@ def evaluate_zero_shot():
                 print(f"Error generating response for task: {task_description}, Error: {e}")
                 continue
 
+    if structured and safe_queries:
+        try:
+            with span("generation", items=len(safe_queries)):
+                answers = invoke_structured_batch(model, [prompt for _, prompt in safe_queries], FINAL_ANSWER_SCHEMA)
+        except Exception as e:
+            print(f"Error generating structured responses, Error: {e}")
+            answers = []
+        for (query, _), answer in zip(safe_queries, answers):
+            responses.append({
+                "query_id": query.get("id", ""),
+                "task_description": query.get("input", ""),
+                "response": json.dumps(answer, ensure_ascii=False) if answer is not None else "",
+                "expected_output": query.get("expected_output", None)
+            })
+
     # Evaluate responses
     evaluation_results = []
     for item in responses:
         response = item["response"]
         expected_output = item["expected_output"]
         task_description = item["task_description"]
-        metrics = evaluate_zero_shot_response(response, expected_output)
+        with span("evaluation"):
+            metrics = evaluate_zero_shot_response(response, expected_output, structured=structured)
         evaluation_results.append({
+            "query_id": item["query_id"],
             'task_description': task_description,
             "response": response,  
             "expected_output": expected_output,
@@ -103,6 +144,16 @@ def evaluate_zero_shot():
         })    # Save evaluation results
     output_file = "evaluation/zero_shot_evaluation_results.json"
     save_json(evaluation_results, output_file)
+
+    # Record the run in the indexed result store for cross-run comparison
+    template = zero_shot_prompt("{task_description}", "{context}")
+    if structured:
+        template += f"\n\n{schema_instruction(FINAL_ANSWER_SCHEMA)}"
+    template_hash = prompt_hash(template)
+    with ResultStore() as store:
+        run_id = store.start_run(strategy="zero_shot", prompt_version=template_hash)
+        store.ingest(run_id, evaluation_results, agent_type="zero_shot", prompt_version=template_hash)
+    print(f"Run {run_id} recorded in {store.db_path}")
     
     print(f"Evaluation completed. Results saved to {output_file}")
     return evaluation_results
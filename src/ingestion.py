@@ -0,0 +1,441 @@
+"""
+Streaming ingestion of query sets for the evaluation system.
+This module reads JSON and JSONL query files (single files, lists or globs of
+shards) one record at a time, validates each record against the query schema
+and drops exact duplicate inputs, plus near duplicates via MinHash/LSH when
+enabled.
+
+Near-duplicate dropping is enabled per call with ``near_duplicate_threshold``
+or for every run by setting the ``AGENT_NEAR_DUP_THRESHOLD`` environment
+variable (e.g. ``0.8``).
+"""
+
+import glob
+import hashlib
+import json
+import os
+import re
+from array import array
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+
+# Field name -> (required, allow empty)
+QUERY_SCHEMA = {
+    "id": (True, False),
+    "input": (True, False),
+    "expected_output": (True, True),
+    "domain": (False, True),
+    "task_type": (False, True),
+    "grade_level": (False, True),
+    "topic": (False, True),
+    "difficulty": (False, True),
+    "context": (False, True),
+}
+
+NEAR_DUPLICATE_ENV = "AGENT_NEAR_DUP_THRESHOLD"
+
+_CHUNK_SIZE = 1 << 16
+_NUMBER_RE = re.compile(r"\d+(?:[.,/]\d+)*")
+
+
+class QueryValidationError(ValueError):
+    """Raised in strict mode when a query record fails validation."""
+
+
+def _expand_paths(paths: Union[str, Iterable[str]]) -> List[str]:
+    """Expand a path, glob or directory (or a list of them) into sorted files."""
+    if isinstance(paths, str):
+        paths = [paths]
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if name.endswith((".json", ".jsonl"))
+            ))
+        elif any(ch in path for ch in "*?["):
+            files.extend(sorted(glob.glob(path)))
+        else:
+            files.append(path)
+    return files
+
+
+def _iter_jsonl(file_path: str) -> Iterator[Tuple[int, Any, Optional[str]]]:
+    """Yield (line number, record, error) for each non-blank line of a JSONL file."""
+    with open(file_path, 'r', encoding='utf-8') as file:
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line), None
+            except json.JSONDecodeError as e:
+                yield line_number, None, f"invalid JSON: {e.msg}"
+
+
+def _iter_json_array(file_path: str) -> Iterator[Tuple[int, Any, Optional[str]]]:
+    """
+    Yield (line number, record, error) for each element of a top-level JSON array.
+
+    The file is decoded incrementally in chunks, so only one record is held
+    in memory at a time. A decode error stops the file, since the position of
+    the next record is unknown after malformed JSON.
+    """
+    decoder = json.JSONDecoder()
+    with open(file_path, 'r', encoding='utf-8') as file:
+        buffer = file.read(_CHUNK_SIZE)
+        line_number = 1
+        position = 0
+        started = False
+        eof = not buffer
+
+        while True:
+            # Skip whitespace and separators, counting lines as we go
+            while position < len(buffer) and buffer[position] in " \t\r\n,[]":
+                char = buffer[position]
+                if char == "\n":
+                    line_number += 1
+                elif char == "[":
+                    started = True
+                position += 1
+
+            if position >= len(buffer):
+                if eof:
+                    return
+                buffer = file.read(_CHUNK_SIZE)
+                position = 0
+                eof = not buffer
+                continue
+
+            if not started:
+                yield line_number, None, "top-level value is not a JSON array"
+                return
+
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as e:
+                if not eof:
+                    # The record may continue in the next chunk
+                    more = file.read(_CHUNK_SIZE)
+                    buffer = buffer[position:] + more
+                    position = 0
+                    eof = not more
+                    continue
+                error_line = line_number + buffer.count("\n", position, e.pos)
+                yield error_line, None, f"invalid JSON: {e.msg}"
+                return
+
+            yield line_number, record, None
+            line_number += buffer.count("\n", position, end)
+            position = end
+            if position > _CHUNK_SIZE:
+                buffer = buffer[position:]
+                position = 0
+
+
+def iter_raw_records(paths: Union[str, Iterable[str]]) -> Iterator[Tuple[str, int, Any, Optional[str]]]:
+    """
+    Stream records from JSON or JSONL files without loading them whole.
+
+    Args:
+        paths (str or list): File paths, globs or directories of shards
+
+    Yields:
+        tuple: (file path, line number, record or None, decode error or None)
+    """
+    for file_path in _expand_paths(paths):
+        if not os.path.exists(file_path):
+            yield file_path, 0, None, "file not found"
+            continue
+        reader = _iter_jsonl if file_path.endswith(".jsonl") else _iter_json_array
+        for line_number, record, error in reader(file_path):
+            yield file_path, line_number, record, error
+
+
+def validate_query(record: Any) -> List[str]:
+    """
+    Validate a query record against QUERY_SCHEMA.
+
+    Args:
+        record: Decoded JSON value
+
+    Returns:
+        list: Error messages, empty if the record is valid
+    """
+    if not isinstance(record, dict):
+        return [f"record is a {type(record).__name__}, expected an object"]
+    errors = []
+    for field, (required, allow_empty) in QUERY_SCHEMA.items():
+        if field not in record:
+            if required:
+                errors.append(f"missing required field '{field}'")
+            continue
+        value = record[field]
+        if not isinstance(value, str):
+            errors.append(f"field '{field}' should be a string, got {type(value).__name__}")
+        elif not allow_empty and not value.strip():
+            errors.append(f"field '{field}' is empty")
+    return errors
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace, keeping numbers and operators intact."""
+    return " ".join(text.lower().split())
+
+
+def _numbers(text: str) -> Tuple[str, ...]:
+    """Numeric tokens of a text, in order."""
+    return tuple(_NUMBER_RE.findall(text))
+
+
+def _answer_digest(normalized_input: str, expected_output: str) -> bytes:
+    """Digest of the numbers in an input plus its normalized expected output."""
+    key = "\x1f".join(_numbers(normalized_input) + (normalize_text(expected_output),))
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+
+
+class MinHashLSH:
+    """
+    MinHash signatures with banded locality-sensitive hashing.
+
+    Finds previously added texts whose estimated Jaccard similarity over
+    word shingles is at least the threshold.
+
+    The index is sized for millions of records: each band bucket is keyed by
+    one hashed int, and the signature kept for verifying candidates is the
+    low 32 bits of each minimum packed into bytes.
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, bands: int = 16, shingle_size: int = 3):
+        """
+        Initialize the index.
+
+        Args:
+            threshold (float): Minimum estimated Jaccard similarity for a near duplicate
+            num_perm (int): Number of hash permutations in each signature
+            bands (int): Number of LSH bands, must divide num_perm
+            shingle_size (int): Words per shingle
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        # XOR with a fixed random mask permutes the 64-bit hash space; applying
+        # it through map() keeps the per-shingle work in C.
+        self._masks = [
+            int.from_bytes(hashlib.blake2b(i.to_bytes(4, "big"), digest_size=8).digest(), "big")
+            for i in range(num_perm)
+        ]
+        # Band hash -> key, or a list of keys once a bucket is shared
+        self._buckets: List[Dict[int, Union[str, List[str]]]] = [{} for _ in range(bands)]
+        self._signatures: Dict[str, bytes] = {}
+
+    def signature(self, text: str) -> array:
+        """
+        Compute the MinHash signature of a normalized text.
+
+        Args:
+            text (str): Normalized text
+
+        Returns:
+            array: num_perm minimum hash values (typecode 'Q')
+        """
+        words = text.split()
+        size = self.shingle_size
+        shingles = {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+        hashes = [
+            int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+            for s in shingles
+        ]
+        return array("Q", [min(map(mask.__xor__, hashes)) for mask in self._masks])
+
+    def _band_keys(self, signature: array) -> List[int]:
+        rows = self.rows
+        return [hash(signature[start:start + rows].tobytes()) for start in range(0, self.num_perm, rows)]
+
+    @staticmethod
+    def _compact(signature: array) -> bytes:
+        return array("I", [value & 0xFFFFFFFF for value in signature]).tobytes()
+
+    def query(self, signature: array, accept: Optional[Callable[[str], bool]] = None) -> Optional[str]:
+        """
+        Find an indexed key whose signature is similar enough.
+
+        Args:
+            signature (array): MinHash signature
+            accept (callable): Extra check a candidate key must pass
+
+        Returns:
+            str or None: Key of the first near duplicate found
+        """
+        compact = array("I", self._compact(signature))
+        seen = set()
+        for buckets, band_key in zip(self._buckets, self._band_keys(signature)):
+            bucket = buckets.get(band_key)
+            if bucket is None:
+                continue
+            for key in [bucket] if isinstance(bucket, str) else bucket:
+                if key in seen:
+                    continue
+                seen.add(key)
+                other = array("I", self._signatures[key])
+                matches = sum(x == y for x, y in zip(compact, other))
+                if matches / self.num_perm >= self.threshold and (accept is None or accept(key)):
+                    return key
+        return None
+
+    def add(self, key: str, signature: array):
+        """
+        Index a signature under a key.
+
+        Args:
+            key (str): Record identifier
+            signature (array): MinHash signature
+        """
+        self._signatures[key] = self._compact(signature)
+        for buckets, band_key in zip(self._buckets, self._band_keys(signature)):
+            bucket = buckets.get(band_key)
+            if bucket is None:
+                buckets[band_key] = key
+            elif isinstance(bucket, str):
+                buckets[band_key] = [bucket, key]
+            else:
+                bucket.append(key)
+
+
+class QueryIngestor:
+    """
+    Streams validated, de-duplicated queries and records what was dropped.
+
+    After iterating, ``errors`` holds one entry per invalid record (file,
+    line, messages), ``duplicates`` one entry per dropped duplicate, and
+    ``stats`` the overall counts.
+
+    Near-duplicate dropping is opt-in. Math problems that differ only in a
+    number are otherwise near-identical text, so a near duplicate must also
+    share the same numbers and expected output to be dropped.
+    """
+
+    def __init__(self, near_duplicate_threshold: Optional[float] = None, strict: bool = False):
+        """
+        Initialize the ingestor.
+
+        Args:
+            near_duplicate_threshold (float): Jaccard threshold for near duplicates, None (default) to only drop exact ones
+            strict (bool): Raise QueryValidationError on the first invalid record
+        """
+        self.strict = strict
+        self.lsh = MinHashLSH(near_duplicate_threshold) if near_duplicate_threshold else None
+        self.errors: List[Dict[str, Any]] = []
+        self.duplicates: List[Dict[str, Any]] = []
+        self.stats = {"read": 0, "valid": 0, "invalid": 0, "exact_duplicates": 0, "near_duplicates": 0}
+        # Only fixed-size digests are kept per record so memory stays flat on large sets
+        self._exact: Dict[bytes, str] = {}
+        self._answers: Dict[str, bytes] = {}
+        self._ids = set()
+
+    def _error(self, file_path: str, line_number: int, messages: List[str]):
+        error = {"file": file_path, "line": line_number, "errors": messages}
+        self.stats["invalid"] += 1
+        self.errors.append(error)
+        if self.strict:
+            raise QueryValidationError(f"{file_path}:{line_number}: {'; '.join(messages)}")
+        print(f"Invalid query at {file_path}:{line_number}: {'; '.join(messages)}")
+
+    def iter_queries(self, paths: Union[str, Iterable[str]]) -> Iterator[Dict[str, Any]]:
+        """
+        Stream valid, unique queries from the given files.
+
+        Args:
+            paths (str or list): File paths, globs or directories of shards
+
+        Yields:
+            dict: Query records
+        """
+        for file_path, line_number, record, decode_error in iter_raw_records(paths):
+            self.stats["read"] += 1
+            if decode_error:
+                self._error(file_path, line_number, [decode_error])
+                continue
+            messages = validate_query(record)
+            if not messages and record["id"] in self._ids:
+                messages = [f"duplicate id '{record['id']}'"]
+            if messages:
+                self._error(file_path, line_number, messages)
+                continue
+            self._ids.add(record["id"])
+
+            normalized = normalize_text(record["input"])
+            digest = hashlib.sha1(normalized.encode("utf-8")).digest()
+            original = self._exact.get(digest)
+            kind = "exact"
+            if original is None and self.lsh is not None:
+                answer = _answer_digest(normalized, record["expected_output"])
+                signature = self.lsh.signature(normalized)
+                original = self.lsh.query(signature, accept=lambda key: self._answers[key] == answer)
+                kind = "near"
+            if original is not None:
+                self.stats[f"{kind}_duplicates"] += 1
+                self.duplicates.append({
+                    "id": record["id"], "duplicate_of": original, "kind": kind,
+                    "file": file_path, "line": line_number,
+                })
+                continue
+
+            self._exact[digest] = record["id"]
+            if self.lsh is not None:
+                self._answers[record["id"]] = answer
+                self.lsh.add(record["id"], signature)
+            self.stats["valid"] += 1
+            yield record
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Summarize the ingestion.
+
+        Returns:
+            dict: Counts, validation errors and dropped duplicates
+        """
+        return {"stats": dict(self.stats), "errors": self.errors, "duplicates": self.duplicates}
+
+
+def load_queries(paths: Union[str, Iterable[str]], near_duplicate_threshold: Optional[float] = None,
+                 strict: bool = False, allow_invalid: bool = False) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Load validated, de-duplicated queries into a list.
+
+    Args:
+        paths (str or list): File paths, globs or directories of shards
+        near_duplicate_threshold (float): Jaccard threshold for near duplicates; None (default) reads
+            AGENT_NEAR_DUP_THRESHOLD, and 0 or an unset variable only drops exact duplicates
+        strict (bool): Raise QueryValidationError on the first invalid record
+        allow_invalid (bool): Continue with the valid queries when some records are invalid
+
+    Returns:
+        tuple: (queries, ingestion report)
+
+    Raises:
+        QueryValidationError: If any record is invalid and allow_invalid is False
+    """
+    if near_duplicate_threshold is None:
+        near_duplicate_threshold = float(os.getenv(NEAR_DUPLICATE_ENV, "0")) or None
+    ingestor = QueryIngestor(near_duplicate_threshold, strict)
+    queries = list(ingestor.iter_queries(paths))
+    report = ingestor.report()
+    stats = report["stats"]
+    print(
+        f"Loaded {stats['valid']} of {stats['read']} queries "
+        f"({stats['invalid']} invalid, {stats['exact_duplicates']} exact and "
+        f"{stats['near_duplicates']} near duplicates dropped)"
+    )
+    if stats["invalid"] and not allow_invalid:
+        details = "; ".join(
+            f"{error['file']}:{error['line']}: {', '.join(error['errors'])}" for error in report["errors"][:5]
+        )
+        raise QueryValidationError(
+            f"{stats['invalid']} invalid query record(s), refusing to run on a partial set "
+            f"(pass allow_invalid=True to continue): {details}"
+        )
+    return queries, report
@@ -4,25 +4,41 @@ This module orchestrates the different prompting strategies and evaluation proce
 """
 
 import json
+import os
+import random
+import sys
 import time
 from typing import Dict, List, Any
+
+# Add the repository root to the Python path so every module is imported under
+# its single canonical name (src.*); importing e.g. both "tracing" and
+# "src.tracing" would create two separate tracers.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from prompts.zero_shot import zero_shot_prompt, evaluate_zero_shot_response
 from prompts.few_shot import few_shot_prompt, create_example, evaluate_few_shot_response
 from prompts.cot_prompt import cot_prompt, evaluate_cot_response
 from prompts.meta_prompt import meta_prompt, optimize_prompt
-from utils import load_json, save_json, calculate_metrics
+from src.utils import load_json, save_json, calculate_metrics, check_final_answer, get_grader_model
+from src.tracing import span
+from src.result_store import ResultStore, prompt_hash
+from src.ingestion import load_queries
+from src.sampling import run_adaptive_evaluation
+from src.structured_output import CountingModel
 
 class DomainSpecificAgent:
     """Main class for domain-specific agent operations."""
     
-    def __init__(self, agent_type="zero_shot"):
+    def __init__(self, agent_type="zero_shot", grader=None):
         """
         Initialize the domain-specific agent.
         
         Args:
             agent_type (str): Type of agent ("zero_shot", "few_shot", "cot", "meta_prompt")
+            grader: Model instance used to grade answers, defaults to the Gemini grader
         """
         self.agent_type = agent_type
+        self.grader = grader
         self.capabilities = [
             "text_analysis", "classification", "reasoning", 
             "problem_solving", "domain_adaptation"
@@ -43,41 +59,86 @@ class DomainSpecificAgent:
         task_input = query_data.get("input", "")
         domain = query_data.get("domain", "")
         task_type = query_data.get("task_type", "")
+        expected_output = query_data.get("expected_output")
+        
+        with span("process_query", query_id=query_data.get("id", ""), agent_type=self.agent_type):
+            with span("prompt_construction"):
+                prompt, examples = self._build_prompt(task_input, domain, task_type)
+            with span("generation"):
+                response = self._simulate_agent_response(prompt)
+            with span("evaluation"):
+                metrics = self._evaluate_response(response, examples, expected_output)
+        
+        end_time = time.time()
+        response_time = end_time - start_time
+        
+        return {
+            "query_id": query_data.get("id", ""),
+            "agent_type": self.agent_type,
+            "prompt_hash": self.prompt_hash(),
+            "response": response,
+            "response_time": response_time,
+            "metrics": metrics
+        }
+    
+    def prompt_hash(self) -> str:
+        """
+        Fingerprint this agent's prompt template, for comparing runs across prompt changes.
         
-        # Generate prompt based on agent type
+        Returns:
+            str: Hash of the prompt built from placeholder inputs
+        """
+        prompt, _ = self._build_prompt("{input}", "{domain}", "{task_type}")
+        return prompt_hash(prompt)
+    
+    def _build_prompt(self, task_input: str, domain: str, task_type: str):
+        """
+        Build the prompt for the agent type.
+        
+        Args:
+            task_input (str): Query input
+            domain (str): Domain name
+            task_type (str): Type of task
+        
+        Returns:
+            tuple: (prompt, few-shot examples used, empty for other agent types)
+        """
+        examples = []
         if self.agent_type == "zero_shot":
             prompt = zero_shot_prompt(f"{task_type} in {domain}", task_input)
-            response = self._simulate_agent_response(prompt)
-            metrics = evaluate_zero_shot_response(response)
-            
         elif self.agent_type == "few_shot":
             examples = self._get_domain_examples(domain, task_type)
             prompt = few_shot_prompt(f"{task_type} in {domain}", examples, task_input)
-            response = self._simulate_agent_response(prompt)
-            metrics = evaluate_few_shot_response(response, examples)
-            
         elif self.agent_type == "cot":
             prompt = cot_prompt(f"{task_type} in {domain}: {task_input}")
-            response = self._simulate_agent_response(prompt)
-            metrics = evaluate_cot_response(response)
-            
         elif self.agent_type == "meta_prompt":
             prompt = meta_prompt(f"{task_type} in {domain}", self.capabilities, task_input)
-            response = self._simulate_agent_response(prompt)
-            metrics = {"length": len(response), "has_solution": bool(response.strip())}
-        
         else:
             raise ValueError(f"Unknown agent type: {self.agent_type}")
+        return prompt, examples
+    
+    def _evaluate_response(self, response: str, examples: List[Dict[str, str]], expected_output) -> Dict[str, Any]:
+        """
+        Evaluate a response with the agent type's metrics.
         
-        end_time = time.time()
-        response_time = end_time - start_time
+        Args:
+            response (str): Agent response
+            examples (list): Few-shot examples used in the prompt
+            expected_output (str): Expected output for comparison
         
+        Returns:
+            dict: Evaluation metrics
+        """
+        if self.agent_type == "zero_shot":
+            return evaluate_zero_shot_response(response, expected_output, grader=self.grader)
+        if self.agent_type == "few_shot":
+            return evaluate_few_shot_response(response, examples, expected_output)
+        if self.agent_type == "cot":
+            return evaluate_cot_response(response, expected_output, grader=self.grader)
         return {
-            "query_id": query_data.get("id", ""),
-            "agent_type": self.agent_type,
-            "response": response,
-            "response_time": response_time,
-            "metrics": metrics
+            "length": len(response),
+            "has_solution": bool(response.strip()),
+            "matches_expected": check_final_answer(response, expected_output, self.grader) if expected_output else None,
         }
     
     def _simulate_agent_response(self, prompt: str) -> str:
@@ -120,40 +181,118 @@ class DomainSpecificAgent:
         ]
         return examples
 
-def run_evaluation(input_file: str, output_file: str):
+def run_evaluation(input_file: str, output_file: str, store: ResultStore = None, grader=None,
+                   near_duplicate_threshold: float = None):
     """
     Run evaluation on a set of input queries.
     
     Args:
-        input_file (str): Path to input queries JSON file
+        input_file (str): Path, glob or directory of input query JSON/JSONL files
         output_file (str): Path to output logs JSON file
+        store (ResultStore): Result store to record the run in, if any
+        grader: Model instance used to grade answers, defaults to the Gemini grader
+        near_duplicate_threshold (float): Drop near-duplicate queries at this Jaccard similarity,
+            defaults to the AGENT_NEAR_DUP_THRESHOLD environment variable
     """
     # Load input queries
-    queries = load_json(input_file)
+    queries, _ = load_queries(input_file, near_duplicate_threshold)
     results = []
     
     # Test different agent types
     agent_types = ["zero_shot", "few_shot", "cot", "meta_prompt"]
+    agents = [DomainSpecificAgent(agent_type, grader) for agent_type in agent_types]
+    run_version = prompt_hash("".join(agent.prompt_hash() for agent in agents))
+    run_id = store.start_run(strategy="all", prompt_version=run_version) if store else None
     
-    for agent_type in agent_types:
-        agent = DomainSpecificAgent(agent_type)
+    for agent in agents:
+        agent_results = []
         
         for query in queries:
             result = agent.process_query(query)
-            # Add evaluation scores (simulated)
+            metrics = result["metrics"]
+            matches = metrics.get("matches_expected")
+            # Accuracy comes from grading; completeness and relevance are still simulated
             result.update({
-                "accuracy_score": random.uniform(0.8, 1.0),
+                "accuracy_score": metrics.get("score", None if matches is None else float(matches)),
                 "completeness_score": random.uniform(0.7, 1.0),
                 "relevance_score": random.uniform(0.8, 1.0)
             })
-            results.append(result)
+            agent_results.append(result)
+        
+        results.extend(agent_results)
+        if store:
+            store.ingest(run_id, agent_results)
     
     # Save results
     save_json(results, output_file)
     print(f"Evaluation completed. Results saved to {output_file}")
+    if store:
+        print(f"Run {run_id} recorded in {store.db_path}")
 
-def main():
-    """Main application entry point."""
+def run_sampled_evaluation(input_file: str, output_file: str, target_width: float = 0.1,
+                           confidence: float = 0.95, batch_size: int = 10, grader=None,
+                           near_duplicate_threshold: float = None) -> Dict[str, Any]:
+    """
+    Estimate per-agent accuracy from a stratified sample of the input queries.
+    
+    Queries are drawn across difficulty, topic and grade level in batches
+    until each agent type's accuracy interval is at most target_width wide.
+    
+    Args:
+        input_file (str): Path, glob or directory of input query JSON/JSONL files
+        output_file (str): Path to save the sampling report JSON file
+        target_width (float): Confidence interval width to stop at
+        confidence (float): Confidence level of the interval
+        batch_size (int): Queries evaluated per agent type between stopping checks
+        grader: Model instance used to grade answers, defaults to the Gemini grader
+        near_duplicate_threshold (float): Drop near-duplicate queries at this Jaccard similarity,
+            defaults to the AGENT_NEAR_DUP_THRESHOLD environment variable
+    
+    Returns:
+        dict: Sampling report with estimates, intervals and API calls saved
+    """
+    queries, _ = load_queries(input_file, near_duplicate_threshold)
+    # Queries without an expected output cannot be graded, so they are not part of the population
+    gradeable = [query for query in queries if query.get("expected_output", "").strip()]
+    if len(gradeable) < len(queries):
+        print(f"Skipping {len(queries) - len(gradeable)} queries without an expected output")
+    agent_types = ["zero_shot", "few_shot", "cot", "meta_prompt"]
+    # Every model request goes through the counter, so API usage is measured, not assumed
+    grader = CountingModel(grader or get_grader_model())
+    agents = {agent_type: DomainSpecificAgent(agent_type, grader) for agent_type in agent_types}
+    
+    def judge(agent_type, query):
+        result = agents[agent_type].process_query(query)
+        matches = result["metrics"].get("matches_expected")
+        return None if matches is None else bool(matches)
+    
+    report = run_adaptive_evaluation(
+        gradeable, agent_types, judge,
+        target_width=target_width, confidence=confidence, batch_size=batch_size,
+        call_counter=lambda: grader.calls
+    )
+    save_json(report, output_file)
+    
+    print("\nSampled Accuracy:")
+    for agent_type, estimate in report["agents"].items():
+        print(
+            f"{agent_type}: {estimate['accuracy']:.2f} "
+            f"[{estimate['ci_low']:.2f}, {estimate['ci_high']:.2f}] "
+            f"from {estimate['evaluated']}/{estimate['population']} queries"
+        )
+    print(f"API calls: {report['api_calls']} of {report['api_calls_full_run']} "
+          f"({report['api_calls_saved']} saved)")
+    return report
+
+def main(sampled: bool = False, near_duplicate_threshold: float = None):
+    """
+    Main application entry point.
+    
+    Args:
+        sampled (bool): Run the adaptive sampling evaluation instead of the full cross product
+        near_duplicate_threshold (float): Drop near-duplicate queries at this Jaccard similarity,
+            defaults to the AGENT_NEAR_DUP_THRESHOLD environment variable
+    """
     print("Domain-Specific Agent Evaluation System")
     print("=" * 40)
     
@@ -161,8 +300,18 @@ def main():
     input_file = "evaluation/input_queries.json"
     output_file = "evaluation/output_logs.json"
     
+    if sampled:
+        try:
+            run_sampled_evaluation(input_file, "evaluation/sampled_evaluation_report.json",
+                                   near_duplicate_threshold=near_duplicate_threshold)
+        except Exception as e:
+            print(f"Error during evaluation: {e}")
+        return
+    
     try:
-        run_evaluation(input_file, output_file)
+        with ResultStore() as store:
+            run_evaluation(input_file, output_file, store,
+                           near_duplicate_threshold=near_duplicate_threshold)
         print("Evaluation completed successfully!")
         
         # Calculate and display summary metrics
@@ -175,6 +324,14 @@ def main():
     except Exception as e:
         print(f"Error during evaluation: {e}")
 
+def _near_duplicate_arg(argv: List[str]):
+    """Threshold from a --near-dup or --near-dup=THRESHOLD flag (0.8 if no value), else None."""
+    for arg in argv:
+        if arg == "--near-dup":
+            return 0.8
+        if arg.startswith("--near-dup="):
+            return float(arg.split("=", 1)[1])
+    return None
+
 if __name__ == "__main__":
-    import random
-    main()
+    main(sampled="--sample" in sys.argv, near_duplicate_threshold=_near_duplicate_arg(sys.argv))
@@ -1,6 +1,7 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
 import os
 
+from src.structured_output import SAFETY_SCHEMA, invoke_structured
+from src.tracing import span, traced, record_usage
 
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
@@ -13,6 +14,9 @@ def get_model():
     Returns:
         ChatGoogleGenerativeAI: Configured model instance
     """
+    # Imported here so the offline paths (LocalModel, tests) do not need the SDK
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
     llm = ChatGoogleGenerativeAI(
         model="gemini-2.0-flash-lite",
         temperature=0.7,
@@ -22,16 +26,38 @@ def get_model():
     )
     return llm
 
-def is_query_harmful(query, model):
+def get_safety_model():
+    """
+    Initialize and return the model used for safety classification.
+
+    Deterministic and capped to a few output tokens, since it only emits a label.
+
+    Returns:
+        ChatGoogleGenerativeAI: Configured classifier model instance
+    """
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    llm = ChatGoogleGenerativeAI(
+        model="gemini-2.5-flash-lite-preview-06-17",
+        temperature=0.0,
+        max_output_tokens=56,
+        top_p=0.95,
+        top_k=40
+    )
+    return llm
+
+@traced("safety_check")
+def is_query_harmful(query, model, structured=False):
     """
     Check if a query is harmful using the specified model.
 
     Args:
         query (str): The query to check
-        model (ChatGoogleGenerativeAI): The model instance to use for checking
+        model (ChatGoogleGenerativeAI): The model instance to use for checking, normally get_safety_model()
+        structured (bool): Ask for a JSON label instead of parsing free text
 
     Returns:
-        bool: True if the query is harmful, False otherwise
+        bool: True if the query is harmful (or no valid label was received), False otherwise
     """
     query_to_check = f"""
     You are a safety classifier. Your task is to determine if a given query is harmful or
@@ -42,15 +68,18 @@ def is_query_harmful(query, model):
     Here is the query you need to evaluate:
     {query}
     """
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash-lite-preview-06-17",
-        temperature=0.0,
-        max_output_tokens=56,
-        top_p=0.95,
-        top_k=40
-    )
+    if structured:
+        result = invoke_structured(model, query_to_check, SAFETY_SCHEMA)
+        print(f"Safety check result: {result}")
+        if result is None:
+            # Fail closed: a query that could not be classified is not generated for
+            print("No valid safety label received, treating the query as harmful.")
+            return True
+        return result["label"] == "harmful"
 
-    response = model.invoke(query_to_check)
+    with span("model_call") as call_span:
+        response = model.invoke(query_to_check)
+        record_usage(call_span, response, getattr(model, "model", None))
     print(f"Safety check response: {response}")
     if "harmful" in response.content.lower():
         return True
@@ -0,0 +1,261 @@
+"""
+Indexed result store for comparing evaluation runs.
+This module keeps every run's results in a local SQLite database, tagged with
+a run id and prompt hash, so runs can be diffed and per-query trends queried
+without reloading whole JSON result files.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional
+
+
+DEFAULT_DB_PATH = "evaluation/results.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    strategy TEXT,
+    prompt_hash TEXT,
+    notes TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id TEXT NOT NULL,
+    query_id TEXT NOT NULL,
+    agent_type TEXT NOT NULL,
+    prompt_hash TEXT,
+    correct INTEGER,
+    score REAL,
+    response_time REAL,
+    metrics TEXT,
+    response TEXT,
+    PRIMARY KEY (run_id, agent_type, query_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_results_query ON results (query_id, agent_type, run_id);
+CREATE INDEX IF NOT EXISTS idx_results_agent ON results (agent_type, run_id);
+CREATE INDEX IF NOT EXISTS idx_results_prompt ON results (prompt_hash);
+CREATE INDEX IF NOT EXISTS idx_runs_created ON runs (created_at);
+"""
+
+
+def prompt_hash(prompt_text: str) -> str:
+    """
+    Fingerprint a prompt template.
+
+    Args:
+        prompt_text (str): Prompt template text
+
+    Returns:
+        str: Short stable hash of the text
+    """
+    return hashlib.sha1(prompt_text.encode("utf-8")).hexdigest()[:12]
+
+
+def _correct(metrics: Dict[str, Any]) -> Optional[int]:
+    value = metrics.get("matches_expected")
+    return None if value is None else int(bool(value))
+
+
+class ResultStore:
+    """SQLite-backed store of evaluation results across runs."""
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        """
+        Open (and create if needed) the result store.
+
+        Args:
+            db_path (str): Path to the SQLite database file
+        """
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def start_run(self, strategy: str = "", prompt_version: Optional[str] = None,
+                  run_id: Optional[str] = None, notes: str = "") -> str:
+        """
+        Register a new run.
+
+        Args:
+            strategy (str): Prompting strategy or runner name
+            prompt_version (str): Prompt hash or version label
+            run_id (str): Explicit run id, generated if omitted
+            notes (str): Free-form notes
+
+        Returns:
+            str: The run id
+        """
+        run_id = run_id or time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO runs VALUES (?, ?, ?, ?, ?)",
+                (run_id, time.time(), strategy, prompt_version, notes),
+            )
+        return run_id
+
+    def ingest(self, run_id: str, results: Iterable[Dict[str, Any]],
+               agent_type: Optional[str] = None, prompt_version: Optional[str] = None,
+               batch_size: int = 5000) -> int:
+        """
+        Add results to a run, committing in batches.
+
+        Re-ingesting the same (run, agent type, query) replaces the earlier row.
+
+        Args:
+            run_id (str): Run the results belong to
+            results (iterable): Result dicts with query_id, metrics and optional scores
+            agent_type (str): Agent type for results that do not carry one
+            prompt_version (str): Prompt hash for results that do not carry one
+            batch_size (int): Rows per transaction
+
+        Returns:
+            int: Number of rows written
+        """
+        sql = "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+        rows, written = [], 0
+        for result in results:
+            metrics = result.get("metrics") or {}
+            score = result.get("accuracy_score", metrics.get("score"))
+            rows.append((
+                run_id,
+                str(result.get("query_id") or result.get("task_description", "")),
+                result.get("agent_type") or agent_type or "",
+                result.get("prompt_hash") or prompt_version,
+                _correct(metrics),
+                score,
+                result.get("response_time"),
+                json.dumps(metrics, ensure_ascii=False, default=str),
+                result.get("response"),
+            ))
+            if len(rows) >= batch_size:
+                with self.conn:
+                    self.conn.executemany(sql, rows)
+                written += len(rows)
+                rows = []
+        if rows:
+            with self.conn:
+                self.conn.executemany(sql, rows)
+            written += len(rows)
+        return written
+
+    def import_json(self, file_path: str, strategy: str = "", agent_type: Optional[str] = None) -> str:
+        """
+        Ingest an existing JSON results file as a new run.
+
+        Args:
+            file_path (str): Path to a results JSON file
+            strategy (str): Strategy name for the run
+            agent_type (str): Agent type for results that do not carry one
+
+        Returns:
+            str: The new run id
+        """
+        with open(file_path, 'r', encoding='utf-8') as file:
+            results = json.load(file)
+        run_id = self.start_run(strategy=strategy, notes=f"imported from {file_path}")
+        self.ingest(run_id, results, agent_type=agent_type or strategy)
+        return run_id
+
+    def list_runs(self) -> List[Dict[str, Any]]:
+        """
+        List runs, oldest first.
+
+        Returns:
+            list: Run records
+        """
+        cursor = self.conn.execute(
+            "SELECT run_id, created_at, strategy, prompt_hash, notes FROM runs ORDER BY created_at"
+        )
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def diff_runs(self, run_a: str, run_b: str, changed_only: bool = True) -> List[Dict[str, Any]]:
+        """
+        Compare two runs query by query.
+
+        Args:
+            run_a (str): Baseline run id
+            run_b (str): Candidate run id
+            changed_only (bool): Only return rows whose correctness differs
+
+        Returns:
+            list: Rows with query_id, agent_type and both runs' correctness and score
+        """
+        sql = """
+            SELECT a.query_id, a.agent_type, a.correct, b.correct, a.score, b.score
+            FROM results a JOIN results b
+              ON b.run_id = ? AND b.agent_type = a.agent_type AND b.query_id = a.query_id
+            WHERE a.run_id = ?
+        """
+        if changed_only:
+            sql += " AND a.correct IS NOT b.correct"
+        return [
+            {
+                "query_id": query_id, "agent_type": agent,
+                "correct_a": correct_a, "correct_b": correct_b,
+                "score_a": score_a, "score_b": score_b,
+            }
+            for query_id, agent, correct_a, correct_b, score_a, score_b
+            in self.conn.execute(sql, (run_b, run_a))
+        ]
+
+    def accuracy_trend(self, query_id: str, agent_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Accuracy of one query across runs, oldest run first.
+
+        Args:
+            query_id (str): Query to follow
+            agent_type (str): Restrict to one agent type
+
+        Returns:
+            list: Per-run records with run_id, created_at, accuracy and count
+        """
+        sql = """
+            SELECT r.run_id, runs.created_at, AVG(r.correct), COUNT(*)
+            FROM results r JOIN runs ON runs.run_id = r.run_id
+            WHERE r.query_id = ?
+        """
+        params = [query_id]
+        if agent_type:
+            sql += " AND r.agent_type = ?"
+            params.append(agent_type)
+        sql += " GROUP BY r.run_id ORDER BY runs.created_at"
+        return [
+            {"run_id": run_id, "created_at": created_at, "accuracy": accuracy, "count": count}
+            for run_id, created_at, accuracy, count in self.conn.execute(sql, params)
+        ]
+
+    def run_summary(self, run_id: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Per-agent-type accuracy for one run.
+
+        Args:
+            run_id (str): Run to summarize
+
+        Returns:
+            dict: Agent type mapped to accuracy and count
+        """
+        cursor = self.conn.execute(
+            "SELECT agent_type, AVG(correct), COUNT(*) FROM results WHERE run_id = ? GROUP BY agent_type",
+            (run_id,),
+        )
+        return {agent: {"accuracy": accuracy, "count": count} for agent, accuracy, count in cursor}
@@ -0,0 +1,298 @@
+"""
+Adaptive stratified sampling evaluation for quick regression checks.
+This module evaluates queries in batches drawn across difficulty, topic and
+grade-level strata, and stops each agent type once the confidence interval
+on its accuracy is narrower than a target width.
+"""
+
+import math
+import random
+from statistics import NormalDist
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+STRATA_KEYS = ("difficulty", "topic", "grade_level")
+POOLED_STRATUM = ("*pooled*",)
+
+
+def stratify(queries: Iterable[Dict[str, Any]], keys: Sequence[str] = STRATA_KEYS,
+             min_size: int = 1) -> Dict[Tuple, List[Dict[str, Any]]]:
+    """
+    Group queries into strata by the given fields.
+
+    Strata smaller than min_size are pooled into one stratum keyed
+    POOLED_STRATUM, so a sparse cross product of keys does not force one
+    draw per handful of queries.
+
+    Args:
+        queries (iterable): Query records
+        keys (sequence): Fields defining a stratum
+        min_size (int): Smallest stratum kept on its own
+
+    Returns:
+        dict: Stratum key tuple mapped to its queries
+    """
+    strata: Dict[Tuple, List[Dict[str, Any]]] = {}
+    for query in queries:
+        stratum = tuple(str(query.get(key, "")) for key in keys)
+        strata.setdefault(stratum, []).append(query)
+    small = [stratum for stratum, items in strata.items() if len(items) < min_size]
+    if len(small) > 1:
+        pooled = strata.setdefault(POOLED_STRATUM, [])
+        for stratum in small:
+            if stratum != POOLED_STRATUM:
+                pooled.extend(strata.pop(stratum))
+    return strata
+
+
+class StratifiedEstimate:
+    """Running stratified accuracy estimate for one agent type."""
+
+    def __init__(self, strata_sizes: Dict[Tuple, int]):
+        """
+        Initialize the estimate.
+
+        Args:
+            strata_sizes (dict): Stratum key mapped to its population size
+        """
+        self.sizes = dict(strata_sizes)
+        self.population = sum(self.sizes.values())
+        self.evaluated = {stratum: 0 for stratum in self.sizes}
+        self.correct = {stratum: 0 for stratum in self.sizes}
+        self.skipped = {stratum: 0 for stratum in self.sizes}
+
+    def add(self, stratum: Tuple, is_correct: bool):
+        self.evaluated[stratum] += 1
+        self.correct[stratum] += int(bool(is_correct))
+
+    def skip(self, stratum: Tuple):
+        """Remove an ungradeable query of a stratum from the population."""
+        self.skipped[stratum] += 1
+        self.sizes[stratum] -= 1
+        self.population -= 1
+
+    @property
+    def total_evaluated(self) -> int:
+        return sum(self.evaluated.values())
+
+    @property
+    def total_skipped(self) -> int:
+        return sum(self.skipped.values())
+
+    def unsampled(self) -> List[Tuple]:
+        """Non-empty strata with no evaluated query yet."""
+        return [stratum for stratum, size in self.sizes.items() if size > 0 and not self.evaluated[stratum]]
+
+    def _stratum_sd(self, stratum: Tuple) -> float:
+        # Laplace-smoothed proportion so small or unanimous strata still report spread
+        n = self.evaluated[stratum]
+        p = (self.correct[stratum] + 1) / (n + 2)
+        return math.sqrt(p * (1 - p))
+
+    def _unsampled_weight(self) -> float:
+        return sum(self.sizes[stratum] for stratum in self.unsampled()) / self.population if self.population else 0.0
+
+    def accuracy(self) -> float:
+        """
+        Population-weighted accuracy over all strata.
+
+        An unsampled stratum counts at 0.5, the midpoint of the range its
+        accuracy could take, so the estimate always covers the whole population.
+        """
+        if not self.population:
+            return 0.0
+        weighted = 0.0
+        for stratum, size in self.sizes.items():
+            n = self.evaluated[stratum]
+            weighted += size * (self.correct[stratum] / n if n else 0.5)
+        return weighted / self.population
+
+    def half_width(self, confidence: float = 0.95) -> float:
+        """
+        Half-width of the confidence interval of the stratified accuracy.
+
+        Sampled strata contribute a normal-approximation term, with the finite
+        population correction shrinking a fully evaluated stratum to zero.
+        An unsampled stratum's accuracy is unknown anywhere in [0, 1], so half
+        of its weight is added outright.
+
+        Args:
+            confidence (float): Confidence level
+
+        Returns:
+            float: Half-width, before any clipping to [0, 1]
+        """
+        if not self.population:
+            return 0.0
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        variance = 0.0
+        for stratum, size in self.sizes.items():
+            n = self.evaluated[stratum]
+            if n == 0:
+                continue
+            weight = size / self.population
+            fpc = (size - n) / (size - 1) if size > 1 else 0.0
+            variance += weight ** 2 * fpc * self._stratum_sd(stratum) ** 2 / n
+        return z * math.sqrt(variance) + self._unsampled_weight() / 2
+
+    def interval(self, confidence: float = 0.95) -> Tuple[float, float]:
+        """
+        Confidence interval of the stratified accuracy, for reporting.
+
+        Stopping decisions should use half_width, since clipping the bounds
+        to [0, 1] understates the width near 0% or 100% accuracy.
+
+        Args:
+            confidence (float): Confidence level
+
+        Returns:
+            tuple: (low, high) bounds clipped to [0, 1]
+        """
+        estimate = self.accuracy()
+        half_width = self.half_width(confidence)
+        return max(0.0, estimate - half_width), min(1.0, estimate + half_width)
+
+    def next_strata(self, batch_size: int, remaining: Dict[Tuple, int]) -> List[Tuple]:
+        """
+        Choose strata for the next batch using Neyman allocation.
+
+        Each draw goes to the stratum furthest below its share of
+        (population size x estimated standard deviation).
+
+        Args:
+            batch_size (int): Number of draws
+            remaining (dict): Unevaluated queries left per stratum
+
+        Returns:
+            list: Stratum keys, one per draw
+        """
+        remaining = dict(remaining)
+        allocated = dict(self.evaluated)
+        targets = {stratum: size * self._stratum_sd(stratum) for stratum, size in self.sizes.items()}
+        total_target = sum(targets.values())
+        picks = []
+        for _ in range(batch_size):
+            open_strata = [stratum for stratum, left in remaining.items() if left > 0]
+            if not open_strata:
+                break
+            drawn = sum(allocated.values()) + 1
+            stratum = max(
+                open_strata,
+                key=lambda s: targets[s] / total_target * drawn - allocated[s],
+            )
+            picks.append(stratum)
+            allocated[stratum] += 1
+            remaining[stratum] -= 1
+        return picks
+
+
+def run_adaptive_evaluation(queries: List[Dict[str, Any]], agent_types: Sequence[str],
+                            judge: Callable[[str, Dict[str, Any]], Optional[bool]],
+                            target_width: float = 0.1, confidence: float = 0.95,
+                            batch_size: int = 10, call_counter: Optional[Callable[[], int]] = None,
+                            calls_per_query: Optional[float] = None,
+                            strata_keys: Sequence[str] = STRATA_KEYS, min_stratum_size: int = 10,
+                            seed: int = 0) -> Dict[str, Any]:
+    """
+    Evaluate agent types on stratified batches until their accuracy intervals are narrow enough.
+
+    The first batch draws one query from every stratum; after that draws
+    follow Neyman allocation. An agent type stops only once every non-empty
+    stratum has been sampled and the unclipped interval is at most
+    target_width wide.
+
+    Args:
+        queries (list): Query records
+        agent_types (sequence): Agent types to evaluate
+        judge (callable): Function (agent_type, query) -> True if the agent answered correctly,
+            False if not, or None if the query cannot be graded (it is then left out of the population)
+        target_width (float): Stop once the interval width is at most this
+        confidence (float): Confidence level of the interval
+        batch_size (int): Queries evaluated per agent type between stopping checks
+        call_counter (callable): Returns the running count of model requests made by judge;
+            used to measure the calls spent and extrapolate the cost of a full run
+        calls_per_query (float): Assumed model calls per evaluated query, used only without call_counter
+        strata_keys (sequence): Fields defining a stratum
+        min_stratum_size (int): Strata smaller than this are pooled together
+        seed (int): Seed for the order queries are drawn within each stratum
+
+    Returns:
+        dict: Per-agent estimates and intervals plus the API calls used and saved
+
+    Raises:
+        ValueError: If there are no queries, or neither call_counter nor calls_per_query is given
+    """
+    if call_counter is None and calls_per_query is None:
+        raise ValueError("Pass call_counter to measure API calls, or calls_per_query to assume them")
+    if not queries:
+        raise ValueError("No queries to evaluate")
+    strata = stratify(queries, strata_keys, min_stratum_size)
+    sizes = {stratum: len(items) for stratum, items in strata.items()}
+    rng = random.Random(seed)
+    report = {
+        "agents": {}, "target_width": target_width, "confidence": confidence,
+        "strata": len(strata), "api_calls_measured": call_counter is not None,
+    }
+    total_used = 0
+    total_full_run = 0
+
+    for agent_type in agent_types:
+        # Each agent type draws its own random order within every stratum
+        order = {stratum: rng.sample(items, len(items)) for stratum, items in strata.items()}
+        estimate = StratifiedEstimate(sizes)
+        calls_before = call_counter() if call_counter else 0
+
+        while estimate.population and (
+                estimate.unsampled() or 2 * estimate.half_width(confidence) > target_width):
+            # Seed every stratum with one draw before allocating by variance
+            picks = estimate.unsampled()
+            if not picks:
+                remaining = {stratum: estimate.sizes[stratum] - estimate.evaluated[stratum] for stratum in sizes}
+                picks = estimate.next_strata(batch_size, remaining)
+            if not picks:
+                break
+            for stratum in picks:
+                query = order[stratum][estimate.evaluated[stratum] + estimate.skipped[stratum]]
+                is_correct = judge(agent_type, query)
+                if is_correct is None:
+                    estimate.skip(stratum)
+                else:
+                    estimate.add(stratum, is_correct)
+            low, high = estimate.interval(confidence)
+            print(
+                f"{agent_type}: {estimate.total_evaluated}/{estimate.population} evaluated, "
+                f"accuracy {estimate.accuracy():.3f} [{low:.3f}, {high:.3f}]"
+            )
+
+        low, high = estimate.interval(confidence)
+        width = 2 * estimate.half_width(confidence)
+        evaluated = estimate.total_evaluated
+        judged = evaluated + estimate.total_skipped
+        if call_counter:
+            used = call_counter() - calls_before
+            per_query = used / judged if judged else 0.0
+        else:
+            per_query = calls_per_query
+            used = round(judged * per_query)
+        # The unevaluated queries are assumed to cost what the evaluated ones did
+        full_run = max(used, round(len(queries) * per_query))
+        total_used += used
+        total_full_run += full_run
+        report["agents"][agent_type] = {
+            "accuracy": estimate.accuracy(),
+            "ci_low": low,
+            "ci_high": high,
+            "ci_width": width,
+            "evaluated": evaluated,
+            "skipped": estimate.total_skipped,
+            "population": estimate.population,
+            "converged": bool(estimate.population) and not estimate.unsampled() and width <= target_width,
+            "api_calls": used,
+            "api_calls_full_run": full_run,
+            "api_calls_saved": full_run - used,
+        }
+
+    report["api_calls"] = total_used
+    report["api_calls_full_run"] = total_full_run
+    report["api_calls_saved"] = total_full_run - total_used
+    return report
@@ -0,0 +1,307 @@
+"""
+Structured (JSON-schema-constrained) output helpers for the evaluation system.
+This module provides compact schemas, a validating parser and a batch invoker
+that only retries the items whose output failed to parse.
+
+Models that support it (the Gemini chat model) are constrained by the
+provider itself through ``response_mime_type``/``response_json_schema``;
+other models (such as LocalModel) get the schema as a prompt instruction.
+Either way every output is validated, and malformed items are retried.
+"""
+
+import json
+from typing import Any, Callable, Dict, List, Optional
+
+from src.tracing import span, record_usage
+
+
+# Compact schemas: a single short object keeps the output to a handful of tokens.
+SAFETY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "label": {"type": "string", "enum": ["harmful", "safe"]},
+    },
+    "required": ["label"],
+}
+
+GRADE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "verdict": {"type": "string", "enum": ["correct", "partial", "wrong"]},
+        "score": {"type": "number", "minimum": 0, "maximum": 1},
+    },
+    "required": ["verdict"],
+}
+
+FINAL_ANSWER_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "reasoning": {"type": "string"},
+        "final_answer": {"type": ["string", "number"]},
+    },
+    "required": ["final_answer"],
+}
+
+_TYPE_CHECKS = {
+    "string": lambda value: isinstance(value, str),
+    "number": lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    "integer": lambda value: isinstance(value, int) and not isinstance(value, bool),
+    "boolean": lambda value: isinstance(value, bool),
+}
+
+
+class StructuredOutputError(ValueError):
+    """Raised when a model output does not match the expected schema."""
+
+
+def schema_instruction(schema: Dict[str, Any]) -> str:
+    """
+    Build the prompt suffix asking the model to answer with JSON only.
+
+    Args:
+        schema (dict): JSON schema the output must follow
+
+    Returns:
+        str: Instruction text to append to a prompt
+    """
+    compact = json.dumps(schema, separators=(",", ":"))
+    return (
+        "Respond with a single JSON object and nothing else, "
+        f"matching this JSON schema: {compact}"
+    )
+
+
+def native_schema_kwargs(model, schema: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Request arguments that make the provider enforce a JSON schema.
+
+    Args:
+        model: Model instance
+        schema (dict): JSON schema the output must follow
+
+    Returns:
+        dict: Keyword arguments for ``invoke``/``batch``, empty if the model
+        has no native structured output
+    """
+    if not hasattr(model, "response_mime_type"):
+        return {}
+    return {"response_mime_type": "application/json", "response_json_schema": schema}
+
+
+def _extract_json_object(text: str) -> str:
+    """Return the outermost {...} span of the text, dropping code fences or chatter."""
+    start = text.find("{")
+    end = text.rfind("}")
+    if start == -1 or end < start:
+        raise StructuredOutputError(f"No JSON object found in output: {text[:80]!r}")
+    return text[start:end + 1]
+
+
+def parse_structured(text: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Parse and validate a model output against a compact schema.
+
+    Only the subset of JSON schema used by the schemas in this module is
+    checked: required keys, primitive types, enums and numeric bounds.
+
+    Args:
+        text (str): Raw model output
+        schema (dict): JSON schema the output must follow
+
+    Returns:
+        dict: The parsed object
+
+    Raises:
+        StructuredOutputError: If the output is not valid JSON or breaks the schema
+    """
+    if not isinstance(text, str):
+        raise StructuredOutputError(f"Expected text output, got {type(text).__name__}")
+    try:
+        data = json.loads(_extract_json_object(text))
+    except json.JSONDecodeError as e:
+        raise StructuredOutputError(f"Invalid JSON in output: {e}") from e
+    if not isinstance(data, dict):
+        raise StructuredOutputError("Output is not a JSON object")
+
+    properties = schema.get("properties", {})
+    for key in schema.get("required", []):
+        if key not in data:
+            raise StructuredOutputError(f"Missing required field: {key}")
+
+    for key, spec in properties.items():
+        if key not in data:
+            continue
+        value = data[key]
+        types = spec.get("type")
+        types = types if isinstance(types, list) else [types]
+        checks = [_TYPE_CHECKS[t] for t in types if t in _TYPE_CHECKS]
+        if checks and not any(check(value) for check in checks):
+            raise StructuredOutputError(f"Field {key} should be of type {'/'.join(types)}")
+        if isinstance(value, str):
+            value = value.strip().lower() if "enum" in spec else value.strip()
+            data[key] = value
+        if "enum" in spec and value not in spec["enum"]:
+            raise StructuredOutputError(f"Field {key} must be one of {spec['enum']}, got {value!r}")
+        if "minimum" in spec and value < spec["minimum"]:
+            raise StructuredOutputError(f"Field {key} is below {spec['minimum']}")
+        if "maximum" in spec and value > spec["maximum"]:
+            raise StructuredOutputError(f"Field {key} is above {spec['maximum']}")
+    return data
+
+
+def _response_text(response: Any) -> str:
+    """Return the text of a model response (AIMessage-like or plain string)."""
+    return getattr(response, "content", response)
+
+
+def invoke_structured_batch(model, prompts: List[str], schema: Dict[str, Any],
+                            max_retries: int = 2) -> List[Optional[Dict[str, Any]]]:
+    """
+    Invoke a model on several prompts and parse each output against a schema.
+
+    The schema is enforced by the provider when the model supports it, and
+    asked for in the prompt otherwise. Items whose output is malformed are
+    re-sent on the next attempt; items that already parsed are never
+    re-requested.
+
+    Args:
+        model: Model instance exposing ``invoke`` (and optionally ``batch``)
+        prompts (list): Prompts to send, without the schema instruction
+        schema (dict): JSON schema each output must follow
+        max_retries (int): Extra attempts for malformed items
+
+    Returns:
+        list: Parsed objects in prompt order, None for items that never parsed
+    """
+    native = native_schema_kwargs(model, schema)
+    if native:
+        full_prompts = list(prompts)
+    else:
+        instruction = schema_instruction(schema)
+        full_prompts = [f"{prompt}\n\n{instruction}" for prompt in prompts]
+    results: List[Optional[Dict[str, Any]]] = [None] * len(prompts)
+    pending = list(range(len(prompts)))
+
+    for attempt in range(max_retries + 1):
+        if not pending:
+            break
+        batch = [full_prompts[i] for i in pending]
+        with span("model_call", attempt=attempt, items=len(batch), native_schema=bool(native)) as call_span:
+            if hasattr(model, "batch"):
+                responses = model.batch(batch, **native)
+            else:
+                responses = [model.invoke(prompt, **native) for prompt in batch]
+            record_usage(call_span, responses, getattr(model, "model", None))
+
+        still_pending = []
+        for index, response in zip(pending, responses):
+            try:
+                results[index] = parse_structured(_response_text(response), schema)
+            except StructuredOutputError as e:
+                print(f"Malformed structured output for item {index} (attempt {attempt + 1}): {e}")
+                still_pending.append(index)
+        pending = still_pending
+
+    return results
+
+
+def invoke_structured(model, prompt: str, schema: Dict[str, Any],
+                      max_retries: int = 2) -> Optional[Dict[str, Any]]:
+    """
+    Invoke a model on a single prompt and parse the output against a schema.
+
+    Args:
+        model: Model instance exposing ``invoke``
+        prompt (str): Prompt to send, without the schema instruction
+        schema (dict): JSON schema the output must follow
+        max_retries (int): Extra attempts if the output is malformed
+
+    Returns:
+        dict or None: Parsed object, or None if every attempt was malformed
+    """
+    return invoke_structured_batch(model, [prompt], schema, max_retries)[0]
+
+
+def extract_final_answer(response: str) -> Optional[str]:
+    """
+    Pull the final-answer field out of a structured generator response.
+
+    Args:
+        response (str): Raw generator output
+
+    Returns:
+        str or None: The final answer as text, or None if the response is not structured
+    """
+    try:
+        answer = parse_structured(response, FINAL_ANSWER_SCHEMA)["final_answer"]
+    except StructuredOutputError:
+        return None
+    return answer if isinstance(answer, str) else str(answer)
+
+
+class LocalResponse:
+    """Minimal stand-in for a LangChain AIMessage."""
+
+    def __init__(self, content: str):
+        self.content = content
+
+    def __repr__(self):
+        return f"LocalResponse(content={self.content!r})"
+
+
+class CountingModel:
+    """
+    Wrapper that counts the prompts sent to a model.
+
+    ``calls`` is the number of model requests actually made, including
+    retries, so callers can report measured rather than assumed API usage.
+    """
+
+    def __init__(self, model):
+        """
+        Initialize the wrapper.
+
+        Args:
+            model: Model instance exposing ``invoke`` (and optionally ``batch``)
+        """
+        self.wrapped = model
+        self.calls = 0
+
+    def invoke(self, prompt: str, **kwargs):
+        self.calls += 1
+        return self.wrapped.invoke(prompt, **kwargs)
+
+    def batch(self, prompts: List[str], **kwargs):
+        self.calls += len(prompts)
+        if hasattr(self.wrapped, "batch"):
+            return self.wrapped.batch(prompts, **kwargs)
+        return [self.wrapped.invoke(prompt, **kwargs) for prompt in prompts]
+
+    def __getattr__(self, name):
+        return getattr(self.wrapped, name)
+
+
+class LocalModel:
+    """
+    Local stand-in model for tests and offline runs.
+
+    Mirrors the ``invoke``/``batch`` surface of the chat models used in this
+    project, answering every prompt with a user-supplied responder function.
+    """
+
+    def __init__(self, responder: Callable[[str], str]):
+        """
+        Initialize the local model.
+
+        Args:
+            responder (callable): Function mapping a prompt to the raw output text
+        """
+        self.responder = responder
+        self.calls = 0
+
+    def invoke(self, prompt: str) -> LocalResponse:
+        self.calls += 1
+        return LocalResponse(self.responder(prompt))
+
+    def batch(self, prompts: List[str]) -> List[LocalResponse]:
+        return [self.invoke(prompt) for prompt in prompts]
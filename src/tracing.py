@@ -0,0 +1,303 @@
+"""
+Lightweight tracing and profiling hooks for the evaluation pipeline.
+This module provides nested timing spans that export to a Chrome trace file
+and an optional sampling profiler. Tracing is off unless enabled, in which
+case each span costs a single flag check.
+
+Enable it from code with ``enable_tracing("traces/run.json")`` or by setting
+the ``AGENT_TRACE_FILE`` environment variable (and ``AGENT_PROFILE_INTERVAL``
+in seconds to also sample stacks). The trace file opens in chrome://tracing
+or https://ui.perfetto.dev.
+"""
+
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from functools import wraps
+from typing import Any, Dict, List, Optional
+
+
+class _NoopSpan:
+    """Span returned while tracing is disabled; every operation does nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """A timed, nestable section of work with attributes."""
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.start = 0.0
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        if stack:
+            self.attributes.setdefault("parent", stack[-1].name)
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        self.tracer._stack().pop()
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        self.tracer._record(self, duration)
+        return False
+
+    def set(self, **attributes):
+        """
+        Attach attributes to the span (model name, token counts, ...).
+
+        Args:
+            **attributes: Attribute names and values
+        """
+        self.attributes.update(attributes)
+
+
+class SamplingProfiler:
+    """
+    Background sampler of the Python stack of one thread.
+
+    Samples are written as collapsed stacks (``a;b;c count``), the input
+    format of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval: float = 0.01, thread_id: Optional[int] = None):
+        """
+        Initialize the profiler.
+
+        Args:
+            interval (float): Seconds between samples
+            thread_id (int): Thread to sample, defaults to the calling thread
+        """
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def save(self, file_path: str):
+        """
+        Write the collapsed stacks to a file.
+
+        Args:
+            file_path (str): Output path
+        """
+        with open(file_path, 'w', encoding='utf-8') as file:
+            for stack, count in self.samples.most_common():
+                file.write(f"{stack} {count}\n")
+        print(f"Profile saved to {file_path}")
+
+
+class Tracer:
+    """Collects spans and exports them as Chrome trace events."""
+
+    def __init__(self):
+        self.enabled = False
+        self.trace_file = None
+        self.events: List[Dict[str, Any]] = []
+        self.profiler: Optional[SamplingProfiler] = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _record(self, span: Span, duration: float):
+        event = {
+            "name": span.name,
+            "ph": "X",
+            "ts": round((span.start - self._origin) * 1e6, 3),
+            "dur": round(duration * 1e6, 3),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": span.attributes,
+        }
+        with self._lock:
+            self.events.append(event)
+
+    def span(self, name: str, **attributes):
+        """
+        Open a span as a context manager.
+
+        Args:
+            name (str): Stage name
+            **attributes: Initial attributes for the span
+
+        Returns:
+            Span: The span, or a no-op stand-in if tracing is disabled
+        """
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, attributes)
+
+    def save(self, file_path: Optional[str] = None):
+        """
+        Write the collected spans as a Chrome trace JSON file.
+
+        Args:
+            file_path (str): Output path, defaults to the configured trace file
+        """
+        file_path = file_path or self.trace_file
+        if not file_path:
+            return
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            events = list(self.events)
+        with open(file_path, 'w', encoding='utf-8') as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file, default=str)
+        print(f"Trace saved to {file_path}")
+        if self.profiler is not None:
+            self.profiler.save(f"{os.path.splitext(file_path)[0]}.profile.txt")
+
+
+_tracer = Tracer()
+_atexit_registered = False
+
+
+def get_tracer() -> Tracer:
+    """Return the process-wide tracer."""
+    return _tracer
+
+
+def span(name: str, **attributes):
+    """
+    Open a span on the process-wide tracer.
+
+    Args:
+        name (str): Stage name
+        **attributes: Initial attributes for the span
+
+    Returns:
+        Span: Context manager timing the enclosed block
+    """
+    if not _tracer.enabled:
+        return _NOOP_SPAN
+    return Span(_tracer, name, attributes)
+
+
+def traced(name: Optional[str] = None):
+    """
+    Decorator wrapping every call of a function in a span.
+
+    Args:
+        name (str): Span name, defaults to the function name
+    """
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _tracer.enabled:
+                return func(*args, **kwargs)
+            with Span(_tracer, span_name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_usage(current_span, response, model_name: Optional[str] = None):
+    """
+    Copy model name and token counts from a model response onto a span.
+
+    Args:
+        current_span (Span): Span to annotate
+        response: Model response (LangChain AIMessage or similar) or a list of them
+        model_name (str): Model name to record, if known
+    """
+    if current_span is _NOOP_SPAN:
+        return
+    if model_name:
+        current_span.set(model=model_name)
+    responses = response if isinstance(response, list) else [response]
+    usages = [getattr(item, "usage_metadata", None) for item in responses]
+    usages = [usage for usage in usages if usage]
+    if usages:
+        current_span.set(
+            input_tokens=sum(usage.get("input_tokens", 0) for usage in usages),
+            output_tokens=sum(usage.get("output_tokens", 0) for usage in usages),
+        )
+
+
+def enable_tracing(trace_file: str, sample_interval: Optional[float] = None):
+    """
+    Turn tracing on and save the trace when the process exits.
+
+    Args:
+        trace_file (str): Path of the Chrome trace JSON file
+        sample_interval (float): If set, also run the sampling profiler at this interval
+    """
+    global _atexit_registered
+    if _tracer.enabled:
+        return
+    with _tracer._lock:
+        _tracer.events = []
+    _tracer.trace_file = trace_file
+    _tracer.profiler = SamplingProfiler(sample_interval) if sample_interval else None
+    if _tracer.profiler is not None:
+        _tracer.profiler.start()
+    _tracer.enabled = True
+    if not _atexit_registered:
+        atexit.register(disable_tracing)
+        _atexit_registered = True
+
+
+def disable_tracing():
+    """Turn tracing off, stop the profiler and save the trace file."""
+    if not _tracer.enabled:
+        return
+    _tracer.enabled = False
+    if _tracer.profiler is not None:
+        _tracer.profiler.stop()
+    _tracer.save()
+
+
+if os.getenv("AGENT_TRACE_FILE"):
+    enable_tracing(
+        os.getenv("AGENT_TRACE_FILE"),
+        float(os.getenv("AGENT_PROFILE_INTERVAL", "0")) or None,
+    )
@@ -7,7 +7,9 @@ import json
 import os
 from typing import Dict, List, Any, Union
 from statistics import mean
-from langchain_google_genai import ChatGoogleGenerativeAI
+
+from src.structured_output import GRADE_SCHEMA, invoke_structured, extract_final_answer
+from src.tracing import span, traced, record_usage
 
 def load_json(file_path: str) -> Union[Dict, List]:
     """
@@ -29,6 +31,24 @@ def load_json(file_path: str) -> Union[Dict, List]:
         print(f"Error decoding JSON from {file_path}: {e}")
         return []
 
+def calculate_metrics(results: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Summarize evaluation results per agent type.
+    
+    Args:
+        results (list): Results as produced by run_evaluation
+    
+    Returns:
+        dict: Agent type mapped to avg_accuracy and count
+    """
+    scores: Dict[str, List[float]] = {}
+    for result in results:
+        scores.setdefault(result.get("agent_type", ""), []).append(result.get("accuracy_score") or 0.0)
+    return {
+        agent_type: {"avg_accuracy": mean(values), "count": len(values)}
+        for agent_type, values in scores.items()
+    }
+
 def save_json(data: Union[Dict, List], file_path: str, indent: int = 2):
     """
     Save data to a JSON file.
@@ -48,18 +68,17 @@ def save_json(data: Union[Dict, List], file_path: str, indent: int = 2):
     except Exception as e:
         print(f"Error saving JSON to {file_path}: {e}")
 
-def check_final_answer(genrated_response: str , actual_respons: str) -> bool:
+def get_grader_model():
     """
-    Check if the response contains a final answer.
-    
-    Args:
-        response (str): The agent's response
-    
+    Initialize and return the model used to grade final answers.
+
     Returns:
-        bool: True if a final answer is present, False otherwise
+        ChatGoogleGenerativeAI: Configured grader model instance
     """
+    # Imported here so the offline paths (LocalModel, tests) do not need the SDK
+    from langchain_google_genai import ChatGoogleGenerativeAI
 
-    llm = ChatGoogleGenerativeAI(
+    return ChatGoogleGenerativeAI(
         model="gemini-2.0-flash-lite",
         temperature=0.0,
         max_output_tokens=56,
@@ -67,6 +86,82 @@ def check_final_answer(genrated_response: str , actual_respons: str) -> bool:
         top_k=40
     )
 
+@traced("grade_final_answer")
+def grade_final_answer(genrated_response: str, actual_respons: str, model=None) -> Dict[str, Any]:
+    """
+    Grade a response against the actual answer using structured output.
+    
+    Args:
+        genrated_response (str): The agent's response (or its final answer)
+        actual_respons (str): The expected answer
+        model: Model instance to grade with, defaults to the Gemini grader
+    
+    Returns:
+        dict: {"verdict": "correct" | "partial" | "wrong", "score": float or None}
+    """
+    llm = model or get_grader_model()
+
+    query = f"""
+    You are a final answer grader. Compare the genrated response with the Actual answer.
+    Use "correct" if it contains the Actual answer, "partial" if it is only partly right,
+    and "wrong" otherwise. Give a score between 0 and 1.
+    
+    genrated response:
+    {genrated_response} 
+
+    Actual answer:
+    {actual_respons}
+    """
+
+    result = invoke_structured(llm, query, GRADE_SCHEMA)
+    if result is None:
+        print("No valid grade received from the model.")
+        return {"verdict": "wrong", "score": None}
+    print(f"Final answer grade: {result}")
+    return {"verdict": result["verdict"], "score": result.get("score")}
+
+def structured_answer_metrics(response: str, expected_output: str, model=None) -> Dict[str, Any]:
+    """
+    Grade the final_answer field of a structured response.
+    
+    Args:
+        response (str): Structured (JSON) agent response
+        expected_output (str): Expected output for comparison
+        model: Model instance to grade with, defaults to the Gemini grader
+    
+    Returns:
+        dict: final_answer, verdict, score and matches_expected
+    """
+    final_answer = extract_final_answer(response)
+    metrics = {"final_answer": final_answer, "verdict": None, "score": None, "matches_expected": None}
+    if not expected_output:
+        return metrics
+    if final_answer is None:
+        # The generator never produced a valid final answer, even after retries
+        grade = {"verdict": "wrong", "score": 0.0}
+    else:
+        grade = grade_final_answer(final_answer, expected_output, model)
+    metrics.update(grade, matches_expected=grade["verdict"] == "correct")
+    return metrics
+
+@traced("check_final_answer")
+def check_final_answer(genrated_response: str , actual_respons: str, model=None, structured=False) -> bool:
+    """
+    Check if the response contains a final answer.
+    
+    Args:
+        response (str): The agent's response
+        model: Model instance to grade with, defaults to the Gemini grader
+        structured (bool): Ask for a JSON verdict instead of parsing free text
+    
+    Returns:
+        bool: True if a final answer is present, False otherwise
+    """
+    if structured:
+        return grade_final_answer(genrated_response, actual_respons, model)["verdict"] == "correct"
+
+    llm = model or get_grader_model()
+
     query = f"""
     You are a final answer classifier. Your task is to determine if a genrated response matches Actual answer.
     A response is considered correct if it contains the Actual answer. Please respond with "correct" if the response contains a final answer,
@@ -80,7 +175,9 @@ def check_final_answer(genrated_response: str , actual_respons: str) -> bool:
     """
 
     print(f"Final answer check query: {query}")
-    response = llm.invoke(query)
+    with span("model_call") as call_span:
+        response = llm.invoke(query)
+        record_usage(call_span, response, getattr(llm, "model", None))
 
     if not response:
         print("No response received from the model.")
@@ -0,0 +1,112 @@
+import json
+
+import pytest
+
+from src import ingestion
+from src.ingestion import QueryIngestor, QueryValidationError, iter_raw_records, load_queries
+
+
+def make_query(query_id, text, expected="1", **extra):
+    return dict({"id": query_id, "input": text, "expected_output": expected}, **extra)
+
+
+def write_json(path, records):
+    path.write_text(json.dumps(records, indent=2), encoding="utf-8")
+    return str(path)
+
+
+def test_records_crossing_chunk_boundaries(tmp_path, monkeypatch):
+    records = [make_query(f"q{i}", "word " * (i * 7 + 1)) for i in range(30)]
+    path = write_json(tmp_path / "queries.json", records)
+    monkeypatch.setattr(ingestion, "_CHUNK_SIZE", 17)
+
+    decoded = [record for _, _, record, error in iter_raw_records(path) if error is None]
+    assert decoded == records
+
+
+def test_line_numbers_track_records_across_chunks(tmp_path, monkeypatch):
+    path = write_json(tmp_path / "queries.json", [make_query("a", "x"), make_query("b", "y")])
+    monkeypatch.setattr(ingestion, "_CHUNK_SIZE", 8)
+
+    lines = [line for _, line, _, _ in iter_raw_records(path)]
+    # indent=2 puts each object on 5 lines after the opening bracket
+    assert lines == [2, 7]
+
+
+def test_decode_error_reports_its_line(tmp_path, monkeypatch):
+    path = tmp_path / "queries.json"
+    path.write_text('[\n  {"id": "a", "input": "x", "expected_output": "1"},\n  {"id": }\n]', encoding="utf-8")
+    monkeypatch.setattr(ingestion, "_CHUNK_SIZE", 16)
+
+    results = list(iter_raw_records(str(path)))
+    assert results[0][2]["id"] == "a"
+    assert results[1][1] == 3
+    assert results[1][3].startswith("invalid JSON")
+
+
+def test_top_level_value_must_be_an_array(tmp_path):
+    path = tmp_path / "queries.json"
+    path.write_text(json.dumps(make_query("a", "x")), encoding="utf-8")
+
+    (_, line, record, error), = list(iter_raw_records(str(path)))
+    assert record is None
+    assert error == "top-level value is not a JSON array"
+
+
+def test_jsonl_errors_report_line_and_field(tmp_path):
+    path = tmp_path / "queries.jsonl"
+    path.write_text(
+        json.dumps(make_query("a", "x")) + "\n{bad\n" + json.dumps({"id": "c", "expected_output": 1}) + "\n",
+        encoding="utf-8",
+    )
+    ingestor = QueryIngestor()
+    assert [q["id"] for q in ingestor.iter_queries(str(path))] == ["a"]
+    assert [(e["line"], e["errors"][0]) for e in ingestor.errors] == [
+        (2, "invalid JSON: Expecting property name enclosed in double quotes"),
+        (3, "missing required field 'input'"),
+    ]
+
+
+def test_load_queries_refuses_partial_sets(tmp_path):
+    path = tmp_path / "queries.jsonl"
+    path.write_text(json.dumps(make_query("a", "x")) + "\n{bad\n", encoding="utf-8")
+
+    with pytest.raises(QueryValidationError, match="queries.jsonl:2"):
+        load_queries(str(path))
+    queries, report = load_queries(str(path), allow_invalid=True)
+    assert [q["id"] for q in queries] == ["a"]
+    assert report["stats"]["invalid"] == 1
+
+
+PROBLEM = ("Each packet of food P contains 12 units of calcium and 4 units of iron. "
+           "The diet requires at least {calcium} units of calcium and at least 460 units of iron. "
+           "How many packets are needed?")
+
+
+def test_exact_and_near_duplicates(tmp_path, monkeypatch):
+    records = [
+        make_query("a", PROBLEM.format(calcium=240), expected="150"),
+        make_query("b", "  " + PROBLEM.format(calcium=240).upper(), expected="150"),
+        make_query("c", PROBLEM.format(calcium=240).replace("How many", "So how many"), expected="150"),
+        make_query("d", PROBLEM.format(calcium=250), expected="155"),
+        make_query("e", "What is 3/4 + 2/5?"),
+        make_query("f", "What is 3/4 - 2/5?"),
+    ]
+    path = write_json(tmp_path / "queries.json", records)
+
+    # Exact-only by default: operators and numbers keep distinct problems apart
+    queries, report = load_queries(path)
+    assert [q["id"] for q in queries] == ["a", "c", "d", "e", "f"]
+    assert [(d["id"], d["duplicate_of"], d["kind"]) for d in report["duplicates"]] == [("b", "a", "exact")]
+
+    # Near-duplicate dropping is opt-in, and a changed number is never a duplicate
+    queries, report = load_queries(path, near_duplicate_threshold=0.8)
+    assert [q["id"] for q in queries] == ["a", "d", "e", "f"]
+    assert [(d["id"], d["kind"]) for d in report["duplicates"]] == [("b", "exact"), ("c", "near")]
+
+    # Runs that do not pass a threshold pick it up from the environment
+    monkeypatch.setenv(ingestion.NEAR_DUPLICATE_ENV, "0.8")
+    queries, _ = load_queries(path)
+    assert [q["id"] for q in queries] == ["a", "d", "e", "f"]
+    queries, _ = load_queries(path, near_duplicate_threshold=0)
+    assert [q["id"] for q in queries] == ["a", "c", "d", "e", "f"]
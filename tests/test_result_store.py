@@ -0,0 +1,43 @@
+import json
+
+from src.result_store import ResultStore
+from src.structured_output import LocalModel
+
+
+def test_store_creates_missing_directories(tmp_path):
+    db_path = tmp_path / "nested" / "dir" / "results.db"
+    with ResultStore(str(db_path)) as store:
+        run_id = store.start_run(strategy="cot")
+        store.ingest(run_id, [{"query_id": "q1", "metrics": {"matches_expected": True}}], agent_type="cot")
+        assert store.run_summary(run_id) == {"cot": {"accuracy": 1.0, "count": 1}}
+    assert db_path.exists()
+
+
+def test_main_runs_are_comparable(tmp_path):
+    from src.main import run_evaluation
+
+    queries_file = tmp_path / "queries.json"
+    queries_file.write_text(json.dumps([
+        {"id": "query_001", "input": "3/4 + 2/5", "expected_output": "23/20"},
+        {"id": "query_003", "input": "sin F", "expected_output": "0.6"},
+    ]), encoding="utf-8")
+
+    with ResultStore(str(tmp_path / "results.db")) as store:
+        run_evaluation(str(queries_file), str(tmp_path / "a.json"), store, LocalModel(lambda p: "correct"))
+        run_evaluation(str(queries_file), str(tmp_path / "b.json"), store, LocalModel(lambda p: "wrong"))
+        run_a, run_b = [run["run_id"] for run in store.list_runs()]
+
+        assert all(run["prompt_hash"] for run in store.list_runs())
+        hashes = dict(store.conn.execute(
+            "SELECT DISTINCT agent_type, prompt_hash FROM results WHERE run_id = ?", (run_a,)
+        ).fetchall())
+        assert set(hashes) == {"zero_shot", "few_shot", "cot", "meta_prompt"}
+        assert None not in hashes.values() and len(set(hashes.values())) == 4
+
+        trend = store.accuracy_trend("query_003", "cot")
+        assert [point["accuracy"] for point in trend] == [1.0, 0.0]
+
+        changed = store.diff_runs(run_a, run_b)
+        assert {(row["agent_type"], row["correct_a"], row["correct_b"]) for row in changed} == {
+            (agent_type, 1, 0) for agent_type in ("zero_shot", "cot", "meta_prompt")
+        }
@@ -0,0 +1,134 @@
+import json
+import random
+
+import pytest
+
+from src.sampling import run_adaptive_evaluation, stratify
+from src.structured_output import CountingModel, LocalModel
+
+
+def make_queries(count, seed=1):
+    rng = random.Random(seed)
+    return [
+        {"id": f"q{i}", "difficulty": rng.choice(["easy", "medium", "hard"]),
+         "topic": rng.choice(["fractions", "algebra"]), "grade_level": rng.choice(["6", "7"])}
+        for i in range(count)
+    ]
+
+
+def test_stratify_groups_by_all_keys():
+    strata = stratify([
+        {"difficulty": "easy", "topic": "algebra", "grade_level": "6"},
+        {"difficulty": "easy", "topic": "algebra", "grade_level": "6"},
+        {"difficulty": "hard", "topic": "algebra", "grade_level": "6"},
+    ])
+    assert sorted(len(items) for items in strata.values()) == [1, 2]
+
+
+def test_stops_early_and_measures_calls():
+    queries = make_queries(2000)
+    rng = random.Random(2)
+    truth = {q["id"]: rng.random() < {"easy": 0.9, "medium": 0.6, "hard": 0.3}[q["difficulty"]] for q in queries}
+    grader = CountingModel(LocalModel(lambda prompt: "correct"))
+
+    def judge(agent_type, query):
+        # One grading request per query, plus a retry for every tenth query
+        grader.invoke(query["id"])
+        if query["id"].endswith("0"):
+            grader.invoke(query["id"])
+        return truth[query["id"]]
+
+    report = run_adaptive_evaluation(queries, ["cot"], judge, target_width=0.08, batch_size=50,
+                                     call_counter=lambda: grader.calls)
+    cot = report["agents"]["cot"]
+    true_accuracy = sum(truth.values()) / len(truth)
+
+    assert cot["converged"] and cot["ci_width"] <= 0.08
+    assert cot["ci_low"] - 0.02 <= true_accuracy <= cot["ci_high"] + 0.02
+    assert cot["evaluated"] < len(queries)
+    assert report["api_calls_measured"]
+    assert report["api_calls"] == grader.calls
+    assert report["api_calls_saved"] == report["api_calls_full_run"] - grader.calls > 0
+
+
+def test_small_sets_are_evaluated_in_full():
+    queries = make_queries(5)
+    report = run_adaptive_evaluation(queries, ["zero_shot"], lambda a, q: True, target_width=0.01, calls_per_query=1)
+    assert report["agents"]["zero_shot"]["evaluated"] == 5
+    assert report["agents"]["zero_shot"]["ci_width"] == 0
+    assert report["api_calls_saved"] == 0
+
+
+def test_requires_a_way_to_count_calls():
+    with pytest.raises(ValueError):
+        run_adaptive_evaluation(make_queries(5), ["cot"], lambda a, q: True)
+
+
+def test_sampled_entry_point_runs_with_a_local_grader(tmp_path):
+    from src.main import run_sampled_evaluation
+
+    queries_file = tmp_path / "queries.json"
+    queries_file.write_text(json.dumps([
+        {"id": f"q{i}", "input": f"What is {i} + {i}?", "expected_output": str(2 * i),
+         "difficulty": "easy", "topic": "addition", "grade_level": "6"}
+        for i in range(40)
+    ]), encoding="utf-8")
+    grader = LocalModel(lambda prompt: "correct")
+
+    report = run_sampled_evaluation(str(queries_file), str(tmp_path / "report.json"),
+                                    target_width=0.3, batch_size=5, grader=grader)
+
+    assert json.loads((tmp_path / "report.json").read_text()) == report
+    assert report["api_calls_measured"]
+    # Graded agent types make one grader request per evaluated query; few_shot uses exact match
+    for agent_type in ("zero_shot", "cot", "meta_prompt"):
+        agent = report["agents"][agent_type]
+        assert agent["accuracy"] == 1.0
+        assert agent["api_calls"] == agent["evaluated"] < 40
+    assert report["agents"]["few_shot"]["api_calls"] == 0
+    assert report["api_calls"] == grader.calls
+    assert report["api_calls_saved"] > 0
+
+
+@pytest.mark.parametrize("strata_count, per_stratum", [(120, 10), (1000, 1)])
+def test_many_small_strata_are_all_sampled_before_stopping(strata_count, per_stratum):
+    queries = [
+        {"id": f"q{s}-{i}", "difficulty": str(s), "topic": "t", "grade_level": "6"}
+        for s in range(strata_count) for i in range(per_stratum)
+    ]
+    report = run_adaptive_evaluation(queries, ["cot"], lambda a, q: True, target_width=0.1, calls_per_query=1)
+    cot = report["agents"]["cot"]
+
+    assert cot["evaluated"] > 0
+    assert cot["accuracy"] == 1.0
+    assert cot["converged"] and cot["ci_width"] <= 0.1
+    if per_stratum == 1:
+        # Singleton strata are pooled instead of each forcing a draw
+        assert report["strata"] == 1 and cot["evaluated"] < len(queries)
+
+
+def test_does_not_stop_early_near_full_accuracy():
+    queries = make_queries(2000)
+    rng = random.Random(3)
+    truth = {q["id"]: rng.random() < 0.97 for q in queries}
+
+    report = run_adaptive_evaluation(queries, ["cot"], lambda a, q: truth[q["id"]],
+                                     target_width=0.1, batch_size=10, calls_per_query=1)
+    cot = report["agents"]["cot"]
+
+    # The stopping width is unclipped, so it is never narrower than the reported bounds
+    assert cot["ci_width"] >= cot["ci_high"] - cot["ci_low"]
+    assert cot["ci_width"] <= 0.1
+    assert cot["evaluated"] >= 100
+
+
+def test_ungradeable_queries_leave_the_population():
+    queries = make_queries(200)
+    report = run_adaptive_evaluation(
+        queries, ["cot"], lambda a, q: None if int(q["id"][1:]) % 4 == 0 else True,
+        target_width=0.2, calls_per_query=1,
+    )
+    cot = report["agents"]["cot"]
+    assert cot["accuracy"] == 1.0
+    assert cot["skipped"] > 0
+    assert cot["population"] == 200 - cot["skipped"]
@@ -0,0 +1,116 @@
+import json
+
+import pytest
+
+from src.structured_output import (
+    FINAL_ANSWER_SCHEMA, GRADE_SCHEMA, SAFETY_SCHEMA, CountingModel, LocalModel, StructuredOutputError,
+    extract_final_answer, invoke_structured_batch, parse_structured,
+)
+from src.model import is_query_harmful
+from src.utils import grade_final_answer
+from prompts.zero_shot import evaluate_zero_shot_response
+
+
+def test_parse_strips_code_fences_and_normalizes_enum_case():
+    assert parse_structured('```json\n{"label": " SAFE "}\n```', SAFETY_SCHEMA) == {"label": "safe"}
+
+
+@pytest.mark.parametrize("text, schema", [
+    ('not json at all', SAFETY_SCHEMA),
+    ('{"label": "maybe"}', SAFETY_SCHEMA),
+    ('{"verdict": "correct", "score": 1.5}', GRADE_SCHEMA),
+    ('{"verdict": "correct", "score": "high"}', GRADE_SCHEMA),
+    ('{"score": 0.5}', GRADE_SCHEMA),
+])
+def test_parse_rejects_malformed_output(text, schema):
+    with pytest.raises(StructuredOutputError):
+        parse_structured(text, schema)
+
+
+def test_final_answer_accepts_numbers():
+    assert parse_structured('{"final_answer": 7}', FINAL_ANSWER_SCHEMA)["final_answer"] == 7
+    assert extract_final_answer('{"final_answer": 7}') == "7"
+    assert extract_final_answer("The answer is 7") is None
+
+
+def test_batch_retries_only_malformed_items():
+    seen = []
+    attempts = {}
+
+    def responder(prompt):
+        seen.append(prompt)
+        key = "b" if prompt.startswith("b") else "a"
+        attempts[key] = attempts.get(key, 0) + 1
+        if key == "b" and attempts[key] == 1:
+            return "sorry, I cannot answer in JSON"
+        return '{"label": "safe"}'
+
+    model = LocalModel(responder)
+    results = invoke_structured_batch(model, ["a prompt", "b prompt"], SAFETY_SCHEMA)
+
+    assert results == [{"label": "safe"}, {"label": "safe"}]
+    assert attempts == {"a": 1, "b": 2}
+    assert model.calls == 3
+
+
+def test_batch_gives_up_after_max_retries():
+    model = LocalModel(lambda prompt: "nope")
+    assert invoke_structured_batch(model, ["x"], SAFETY_SCHEMA, max_retries=1) == [None]
+    assert model.calls == 2
+
+
+def test_is_query_harmful_structured():
+    assert is_query_harmful("how to hurt someone", LocalModel(lambda p: '{"label": "harmful"}'), structured=True)
+    assert not is_query_harmful("add 3/4 + 2/5", LocalModel(lambda p: '{"label": "safe"}'), structured=True)
+
+
+def test_safety_prompt_has_a_single_schema_instruction():
+    prompts = []
+    model = LocalModel(lambda p: prompts.append(p) or '{"label": "safe"}')
+    is_query_harmful("add 3/4 + 2/5", model, structured=True)
+    assert prompts[0].count("Respond with a single JSON object") == 1
+
+
+def test_grade_returns_verdict_and_score():
+    grader = LocalModel(lambda p: '{"verdict": "partial", "score": 0.5}')
+    assert grade_final_answer("23/20", "1.15 or 23/20", grader) == {"verdict": "partial", "score": 0.5}
+
+
+def test_structured_metrics_keep_verdict_and_score():
+    grader = LocalModel(lambda p: '{"verdict": "partial", "score": 0.4}')
+    metrics = evaluate_zero_shot_response(
+        json.dumps({"final_answer": 23}), "23/20", structured=True, grader=grader
+    )
+    assert metrics["final_answer"] == "23"
+    assert metrics["verdict"] == "partial"
+    assert metrics["score"] == 0.4
+    assert metrics["matches_expected"] is False
+
+
+def test_unparsed_final_answer_is_graded_wrong_without_a_model_call():
+    grader = LocalModel(lambda p: '{"verdict": "correct"}')
+    metrics = evaluate_zero_shot_response("", "7", structured=True, grader=grader)
+    assert metrics["verdict"] == "wrong"
+    assert grader.calls == 0
+
+
+def test_is_query_harmful_fails_closed_on_malformed_labels():
+    model = LocalModel(lambda p: "I am not sure")
+    assert is_query_harmful("add 3/4 + 2/5", model, structured=True)
+    assert model.calls == 3
+
+
+def test_native_schema_is_passed_to_provider_models():
+    class ProviderModel(LocalModel):
+        response_mime_type = None
+
+        def batch(self, prompts, **kwargs):
+            self.kwargs = kwargs
+            return super().batch(prompts)
+
+    prompts = []
+    model = ProviderModel(lambda p: prompts.append(p) or '{"label": "safe"}')
+    assert invoke_structured_batch(CountingModel(model), ["q"], SAFETY_SCHEMA) == [{"label": "safe"}]
+    assert model.kwargs == {"response_mime_type": "application/json", "response_json_schema": SAFETY_SCHEMA}
+    # The provider enforces the schema, so the prompt carries no JSON instruction
+    assert prompts == ["q"]
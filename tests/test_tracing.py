@@ -0,0 +1,54 @@
+import json
+import os
+import subprocess
+import sys
+
+from src import tracing
+from src.main import DomainSpecificAgent
+from src.structured_output import LocalModel
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_spans_from_main_and_utils_share_one_trace(tmp_path):
+    trace_file = tmp_path / "trace.json"
+    grader = LocalModel(lambda prompt: "correct")
+    agent = DomainSpecificAgent("meta_prompt", grader)
+
+    tracing.enable_tracing(str(trace_file))
+    try:
+        agent.process_query({"id": "query_001", "input": "3/4 + 2/5", "expected_output": "23/20"})
+    finally:
+        tracing.disable_tracing()
+
+    events = {event["name"]: event for event in json.loads(trace_file.read_text())["traceEvents"]}
+    # process_query is opened in main.py, check_final_answer in utils.py
+    assert events["process_query"]["args"]["query_id"] == "query_001"
+    assert events["evaluation"]["args"]["parent"] == "process_query"
+    assert events["check_final_answer"]["args"]["parent"] == "evaluation"
+    assert events["model_call"]["args"]["parent"] == "check_final_answer"
+
+
+def test_tracing_is_disabled_by_default():
+    assert tracing.span("anything") is tracing.span("anything else")
+
+
+def test_script_entry_point_writes_one_complete_trace(tmp_path):
+    # Running "python src/main.py" puts src/ first on sys.path; tracing must still
+    # load once, so AGENT_TRACE_FILE is written by a single tracer with every span.
+    trace_file = tmp_path / "trace.json"
+    code = (
+        "import sys; sys.path.insert(0, 'src'); import main\n"
+        "from src.structured_output import LocalModel\n"
+        "agent = main.DomainSpecificAgent('meta_prompt', LocalModel(lambda p: 'correct'))\n"
+        "agent.process_query({'id': 'q1', 'input': 'x', 'expected_output': '1'})\n"
+        "print('loaded twice:', 'tracing' in sys.modules)\n"
+    )
+    env = dict(os.environ, AGENT_TRACE_FILE=str(trace_file))
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+
+    assert output.stdout.count("Trace saved") == 1
+    assert "loaded twice: False" in output.stdout
+    names = {event["name"] for event in json.loads(trace_file.read_text())["traceEvents"]}
+    assert {"process_query", "check_final_answer", "model_call"} <= names